@@ -1,41 +1,276 @@
-import requests
+import asyncio
+import codecs
+import contextvars
+import io
 import os
+import sys
+import time
+import queue
+import random
+import threading
 import subprocess
 import yaml
 import json
-from typing import List, Dict, Any
+import hashlib
+import tempfile
+import functools
+try:
+    import orjson
+except ImportError:
+    orjson = None
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Tuple, Callable, Iterable, Iterator, AsyncIterable
 
 from message import Message
-from utils import list_input, get_valid_index, content_input, encode_image_to_base64, Colors
+from utils import list_input, get_valid_index, content_input, encode_image_to_base64, fit_to_context, Colors
 
-import anthropic
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
 
+_CONFIG_CACHE_SIZE = 16
+_config_cache: "OrderedDict[str, tuple]" = OrderedDict()
 
 def load_config(path: str):
-    with open(path, 'r') as config_file:
-        return yaml.safe_load(config_file)
+    """Load a YAML file, reusing the cached parse while its mtime and size are unchanged.
+
+    The returned dict is shared between callers and should be treated as read-only.
+    """
+    cache_key = os.path.abspath(path)
+    stat = os.stat(cache_key)
+    cached = _config_cache.get(cache_key)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        _config_cache.move_to_end(cache_key)
+        return cached[2]
+    with open(cache_key, 'r') as config_file:
+        config = yaml.load(config_file, Loader=_YamlLoader)
+    _config_cache[cache_key] = (stat.st_mtime_ns, stat.st_size, config)
+    _config_cache.move_to_end(cache_key)
+    if len(_config_cache) > _CONFIG_CACHE_SIZE:
+        _config_cache.popitem(last=False)
+    return config
+
+def load_api_config(path: str):
+    """Load config.yaml through a JSON sidecar that is refreshed whenever the YAML is newer."""
+    sidecar_path = path + ".json"
+    try:
+        if os.stat(sidecar_path).st_mtime_ns >= os.stat(path).st_mtime_ns:
+            with open(sidecar_path, 'r') as sidecar_file:
+                return json.load(sidecar_file)
+    except (OSError, ValueError):
+        pass
+
+    config = load_config(path)
+    try:
+        serialized = json.dumps(config)
+    except (TypeError, ValueError):
+        return config  # not JSON-serializable: keep using the YAML parse
+    # JSON turns non-string keys (e.g. 1 or yes) into strings; only cache configs
+    # that read back unchanged, so every run sees the same config.
+    if json.loads(serialized) != config:
+        return config
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w') as tmp_file:
+            tmp_file.write(serialized)
+        os.replace(tmp_path, sidecar_path)
+    except OSError:
+        # Not writable: keep using the YAML parse.
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return config
     
-def list_model_names(providers):
-    return [f"{model}-{version}"
-            for _, details in providers.items()
-            for model, versions in details.get('models', {}).items()
-            for version in versions]
+def build_model_index(providers):
+    """Map each full model name to its (provider, api_key, completion_url)."""
+    index = {}
+    for provider, details in providers.items():
+        for model, versions in details.get('models', {}).items():
+            for version in versions:
+                index[f"{model}-{version}"] = (
+                    provider, details.get("api_key"), details.get("completion_url")
+                )
+    return index
+
+LLT_CONFIG_PATH = os.path.join(os.getenv("LLT_PATH", ""), "config.yaml")
+
+# Config is read on first use rather than at import, so commands that never touch a
+# model don't pay for it.
+@functools.cache
+def get_api_config():
+    return load_api_config(LLT_CONFIG_PATH)
+
+@functools.cache
+def get_model_index():
+    return build_model_index(get_api_config()["providers"])
+
+@functools.cache
+def get_full_model_choices():
+    return list(get_model_index())
+
+
+# Streamed text is handed to a writer thread so a slow terminal never stalls the
+# network read loop; the writer drains whatever has queued up in one write+flush.
+_stream_queue = queue.Queue(maxsize=1024)
+_stream_writer_thread = None
+_stream_writer_lock = threading.Lock()
+# The first error raised while writing to stdout, re-raised by the next stream_flush.
+_stream_error = None
+
+def _drain_stream_queue() -> None:
+    global _stream_error
+    while True:
+        pending = [_stream_queue.get()]
+        while True:
+            try:
+                pending.append(_stream_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            sys.stdout.write("".join(pending))
+            sys.stdout.flush()
+        except Exception as e:
+            # Keep draining so stream_flush and full-queue puts never block forever.
+            if _stream_error is None:
+                _stream_error = e
+        finally:
+            for _ in pending:
+                _stream_queue.task_done()
+
+def stream_write(text: str) -> None:
+    """Queue streamed text for display, blocking only when the queue is full."""
+    global _stream_writer_thread
+    if _stream_writer_thread is None:
+        with _stream_writer_lock:
+            if _stream_writer_thread is None:
+                _stream_writer_thread = threading.Thread(target=_drain_stream_queue, daemon=True)
+                _stream_writer_thread.start()
+    try:
+        _stream_queue.put_nowait(text)
+    except queue.Full:
+        _stream_queue.put(text)
+
+def stream_flush() -> None:
+    """Wait until all queued stream text has been written to stdout.
 
-api_config = load_config(os.path.join(os.getenv("LLT_PATH"), "config.yaml"))
-full_model_choices = list_model_names(api_config["providers"])
+    Raises the error from a failed write (e.g. BrokenPipeError) to the caller.
+    """
+    global _stream_error
+    _stream_queue.join()
+    error, _stream_error = _stream_error, None
+    if error is not None:
+        raise error
+
+# Cleared for completions whose text should be collected without being displayed,
+# e.g. the contenders in race_completion or the workers of get_completions_parallel
+# and get_completions_async.
+stream_echo: "contextvars.ContextVar[bool]" = contextvars.ContextVar("stream_echo", default=True)
+
+def collect_stream(texts: Iterable[str], output: io.StringIO) -> str:
+    """Display text chunks as they arrive and accumulate them into output."""
+    display = stream_write if stream_echo.get() else None
+    append = output.write
+    try:
+        for text in texts:
+            if text:
+                if display:
+                    display(text)
+                append(text)
+    finally:
+        stream_flush()
+    return output.getvalue()
+
+async def collect_stream_async(texts: AsyncIterable[str], output: io.StringIO) -> str:
+    """Async counterpart of collect_stream for async text streams."""
+    display = stream_write if stream_echo.get() else None
+    append = output.write
+    try:
+        async for text in texts:
+            if text:
+                if display:
+                    display(text)
+                append(text)
+    finally:
+        await asyncio.to_thread(stream_flush)
+    return output.getvalue()
+
+# orjson parses the small per-token SSE frames several times faster than json.
+json_loads = orjson.loads if orjson is not None else json.loads
+
+SSE_READ_SIZE = 8192
+_SSE_DATA = b"data: "
+_SSE_DONE = b"data: [DONE]"
+
+def iter_sse_lines(response) -> Iterator[bytes]:
+    """Split a streamed HTTP body into lines, reading SSE_READ_SIZE bytes at a time."""
+    buffer = bytearray()
+    for data in response.iter_content(SSE_READ_SIZE):
+        buffer += data
+        start = 0
+        while (end := buffer.find(b"\n", start)) != -1:
+            yield bytes(buffer[start:end]).rstrip(b"\r")
+            start = end + 1
+        del buffer[:start]
+    if buffer:
+        yield bytes(buffer).rstrip(b"\r")
+
+def iter_sse_text(response) -> Iterator[str]:
+    """Yield the content deltas of an OpenAI-compatible server-sent event stream."""
+    for chunk in iter_sse_lines(response):
+        if chunk.startswith(_SSE_DATA):
+            if chunk.startswith(_SSE_DONE):
+                return
+            json_data = json_loads(chunk[6:])
+            choice = json_data["choices"][0]
+            finish_reason = choice["finish_reason"]
+            if finish_reason is None:
+                yield choice["delta"].get("content")
+            if finish_reason == "stop":
+                return
+
+def iter_process_text(stdout) -> Iterator[str]:
+    """Yield a subprocess's binary stdout as UTF-8 text, as soon as bytes are available."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    for chunk in iter(lambda: stdout.read1(4096), b""):
+        yield decoder.decode(chunk)
+    yield decoder.decode(b"", final=True)
+
+# Connection pool sizing shared by the requests session and the Anthropic httpx client.
+HTTP_POOL_KEEPALIVE = 20
+HTTP_POOL_MAXSIZE = 50
+
+# Shared keep-alive session so consecutive completions reuse TLS connections.
+_http_session = None
+
+def get_http_session():
+    """Return the shared requests session, importing requests on first use."""
+    global _http_session
+    if _http_session is None:
+        import requests
+        _http_session = requests.Session()
+        _http_session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=HTTP_POOL_KEEPALIVE, pool_maxsize=HTTP_POOL_MAXSIZE))
+    return _http_session
 
 
 def get_provider_details(model_name: str):
-    for provider, details in api_config["providers"].items():
-        for model, versions in details.get("models", {}).items():
-            if model_name in [f"{model}-{version}" for version in versions]:
-                api_key_string, completion_url = None, None
-                if details.__contains__("api_key"):
-                    api_key_string = details.__getitem__("api_key")
-                if details.__contains__("completion_url"):
-                    completion_url = details.__getitem__("completion_url")
-                return provider, api_key_string, completion_url
-    raise ValueError(f"Model {model_name} not found in configuration.")
+    try:
+        return get_model_index()[model_name]
+    except KeyError:
+        raise ValueError(f"Model {model_name} not found in configuration.")
+
+# Argument groups shown by get_args and offered by modify_args.
+ARG_CATEGORIES = {
+    "Model Settings": ["model", "temperature", "max_tokens", "top_p", "logprobs", "context_tokens"],
+    "Input/Output": ["load", "file", "write", "prompt"],
+    "Role Settings": ["role"],
+    "Directories": ["cmd_dir", "exec_dir", "ll_dir"],
+    "Mode Settings": ["non_interactive"],
+    "Plugin Settings": ["complete", "detach", "fold", "execute", "view", "email", "url", "tags", "xml", "embeddings", "parallel_exec"]
+}
+NUMBERED_ARG_CATEGORIES = {
+    f"{i}. {category}": keys for i, (category, keys) in enumerate(ARG_CATEGORIES.items(), 1)
+}
 
 def format_args(args) -> str:
     """Format args into a readable string with color coding."""
@@ -44,17 +279,7 @@ def format_args(args) -> str:
     formatted_str = f"\n{Colors.BOLD}Current Configuration:{Colors.RESET}\n"
     formatted_str += "=" * (max_key_length + 30) + "\n"
     
-    # Group arguments by category
-    categories = {
-        "Model Settings": ["model", "temperature", "max_tokens", "top_p", "logprobs"],
-        "Input/Output": ["load", "file", "write", "prompt"],
-        "Role Settings": ["role"],
-        "Directories": ["cmd_dir", "exec_dir", "ll_dir"],
-        "Mode Settings": ["non_interactive"],
-        "Plugin Settings": ["complete", "detach", "fold", "execute", "view", "email", "url", "tags", "xml", "embeddings"]
-    }
-    
-    for category, keys in categories.items():
+    for category, keys in ARG_CATEGORIES.items():
         relevant_args = {k: args_dict[k] for k in keys if k in args_dict}
         if relevant_args:
             formatted_str += f"\n{Colors.BLUE}{category}:{Colors.RESET}\n"
@@ -78,6 +303,30 @@ def get_args(messages: List[Dict[str, any]], args: Dict, index: int = -1) -> Lis
     print(format_args(args))
     return messages
 
+def edit_bool_arg(field: str) -> bool:
+    return list_input(["True", "False"]) == "True"
+
+def edit_number_arg(field: str, value_type: type, type_name: str):
+    while True:
+        try:
+            return value_type(content_input(f"Enter new {type_name} value for {field}: "))
+        except ValueError:
+            print(f"{Colors.RED}Please enter a valid {type_name}.{Colors.RESET}")
+
+def edit_str_arg(field: str) -> str:
+    return content_input(f"Enter new value for {field}: ")
+
+# Prompts used by modify_args, chosen by field name first and then by the current value's type.
+FIELD_EDITORS = {
+    "model": lambda field: list_input(get_full_model_choices()),
+    "role": lambda field: list_input(["user", "assistant", "system", "tool"]),
+}
+TYPE_EDITORS = {
+    bool: edit_bool_arg,
+    int: lambda field: edit_number_arg(field, int, "integer"),
+    float: lambda field: edit_number_arg(field, float, "float"),
+}
+
 def modify_args(messages: List[Dict[str, any]], args: Dict, index: int = -1) -> List[Dict[str, any]]:
     """
     Enhanced interface for modifying arguments with categorization and better UX.
@@ -87,26 +336,16 @@ def modify_args(messages: List[Dict[str, any]], args: Dict, index: int = -1) ->
     # Print current configuration
     print(format_args(args))
     
-    # Categorized fields for better organization
-    categories = {
-        "1. Model Settings": ["model", "temperature", "max_tokens", "top_p", "logprobs"],
-        "2. Input/Output": ["load", "file", "write", "prompt"],
-        "3. Role Settings": ["role"],
-        "4. Directories": ["cmd_dir", "exec_dir", "ll_dir"],
-        "5. Mode Settings": ["non_interactive"],
-        "6. Plugin Settings": ["complete", "detach", "fold", "execute", "view", "email", "url", "tags", "xml", "embeddings"]
-    }
-    
     # Let user select category first
     print(f"\n{Colors.BOLD}Select a category to modify:{Colors.RESET}")
-    category = list_input(list(categories.keys()))
+    category = list_input(list(NUMBERED_ARG_CATEGORIES))
     
     if not category:
         print("No category selected. Args remain unchanged.")
         return messages
     
     # Let user select field from category
-    fields_in_category = categories[category]
+    fields_in_category = NUMBERED_ARG_CATEGORIES[category]
     print(f"\n{Colors.BOLD}Select field to modify:{Colors.RESET}")
     field_to_modify = list_input(fields_in_category)
     
@@ -119,28 +358,8 @@ def modify_args(messages: List[Dict[str, any]], args: Dict, index: int = -1) ->
 
     # Type-specific input handling with validation
     try:
-        if isinstance(current_value, bool):
-            new_value = list_input(["True", "False"]) == "True"
-        elif field_to_modify == "model":
-            new_value = list_input(full_model_choices)
-        elif field_to_modify == "role":
-            new_value = list_input(["user", "assistant", "system", "tool"])
-        elif isinstance(current_value, int):
-            while True:
-                try:
-                    new_value = int(content_input(f"Enter new integer value for {field_to_modify}: "))
-                    break
-                except ValueError:
-                    print(f"{Colors.RED}Please enter a valid integer.{Colors.RESET}")
-        elif isinstance(current_value, float):
-            while True:
-                try:
-                    new_value = float(content_input(f"Enter new float value for {field_to_modify}: "))
-                    break
-                except ValueError:
-                    print(f"{Colors.RED}Please enter a valid float.{Colors.RESET}")
-        else:
-            new_value = content_input(f"Enter new value for {field_to_modify}: ")
+        edit_value = FIELD_EDITORS.get(field_to_modify) or TYPE_EDITORS.get(type(current_value), edit_str_arg)
+        new_value = edit_value(field_to_modify)
     
         if new_value is not None:  # Allow empty string but not None
             setattr(args, field_to_modify, new_value)
@@ -155,6 +374,32 @@ def modify_args(messages: List[Dict[str, any]], args: Dict, index: int = -1) ->
         
     return messages
 
+# Transient provider failures (rate limits, 5xx, dropped connections) are retried
+# with jittered exponential backoff before any output has been streamed.
+RETRY_ATTEMPTS = 5
+RETRY_BASE_DELAY = 0.5
+
+def with_retry(request: Callable[[], Any], is_retryable: Callable[[Exception], bool]) -> Any:
+    """Call request(), retrying with exponential backoff while is_retryable(error) holds."""
+    delay = RETRY_BASE_DELAY
+    for attempt in range(RETRY_ATTEMPTS):
+        try:
+            return request()
+        except Exception as e:
+            if attempt == RETRY_ATTEMPTS - 1 or not is_retryable(e):
+                raise
+            time.sleep(delay + random.random() * delay)
+            delay *= 2
+
+def is_retryable_request_error(error: Exception) -> bool:
+    import requests
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    response = getattr(error, "response", None)
+    return isinstance(error, requests.HTTPError) and response is not None and (
+        response.status_code == 429 or response.status_code >= 500
+    )
+
 def send_request(completion_url: str, api_key_string: str, messages: List[Dict[str, Any]], args: Dict[str, Any]) -> Dict[str, Any]:
     headers = {
         "Authorization": f"Bearer {os.getenv(api_key_string)}",
@@ -169,59 +414,89 @@ def send_request(completion_url: str, api_key_string: str, messages: List[Dict[s
         "stream": True,
     }
     
-    full_response_content = ""
-    try:
-        with requests.post(
-            completion_url, headers=headers, json=data, stream=True
-        ) as response:
+    import requests
+    http_session = get_http_session()
+
+    def open_stream():
+        response = http_session.post(completion_url, headers=headers, json=data, stream=True)
+        try:
             response.raise_for_status()
-            for chunk in response.iter_lines():
-                if chunk:
-                    decoded_chunk = chunk.decode("utf-8")
-                    if decoded_chunk.startswith("data: "):
-                        if decoded_chunk.startswith("data: [DONE]"):
-                            break
-                        json_data = json.loads(decoded_chunk[6:])
-                        choice = json_data["choices"][0]
-                        delta = choice["delta"]
-                        finish_reason = choice["finish_reason"]
-                        if finish_reason is None:
-                            print(delta["content"] or "\n", end="", flush=True)
-                            full_response_content += delta["content"]
-                        if finish_reason == "stop":
-                            print("\r")
-                            break
+        except requests.HTTPError:
+            # Read the error body before releasing the connection so it can still be reported.
+            response.content
+            response.close()
+            raise
+        return response
+
+    response_buffer = io.StringIO()
+    try:
+        with with_retry(open_stream, is_retryable_request_error) as response:
+            collect_stream(iter_sse_text(response), response_buffer)
+            if stream_echo.get():
+                print("\r")
     except requests.RequestException as e:
-        print(f"Request failed: {e}")
-        print(f"Error details:\n{e.response.status_code}\n{e.response.text}")
-    return {"role": "assistant", "content": full_response_content}
-
-def get_anthropic_completion(messages: List[Dict[str, Any]], args: Dict, index: int = -1) -> Dict[str, Any]:
-    """
-    Sends a completion request to Anthropic's API with proper image encoding.
-    """
-    anthropic_client = anthropic.Client()
+        if stream_echo.get():
+            print(f"Request failed: {e}")
+            if e.response is not None:
+                print(f"Error details:\n{e.response.status_code}\n{e.response.text}")
+    return {"role": "assistant", "content": response_buffer.getvalue()}
+
+_anthropic_client = None
+
+def get_anthropic_client():
+    """Return the shared Anthropic client, importing the SDK on first use."""
+    global _anthropic_client
+    if _anthropic_client is None:
+        import anthropic
+        import httpx
+        _anthropic_client = anthropic.Client(max_retries=RETRY_ATTEMPTS - 1, http_client=httpx.Client(limits=httpx.Limits(
+            max_keepalive_connections=HTTP_POOL_KEEPALIVE,
+            max_connections=HTTP_POOL_MAXSIZE,
+            keepalive_expiry=120,
+        )))
+    return _anthropic_client
+
+def prepare_anthropic_messages(messages: List[Dict[str, Any]]):
+    """Split off the system prompt and inline any file:// images as base64 for Anthropic."""
     if messages and messages[0].get("role") == "system":
         system_prompt = messages[0]["content"]
         messages = messages[1:]
     else:
         system_prompt = "You are a helpful programming assistant."
+    if not messages:
+        raise ValueError("No messages to send to Anthropic besides the system prompt.")
     
-    # Encode images in messages
+    # Encode images in messages, reading each distinct file only once
+    encoded_images = {}
     for message in messages:
-        if isinstance(message.get("content"), list):
-            for content_item in message["content"]:
-                if content_item.get("type") == "image" and content_item["source"].get("data").startswith("file://"):
-                    image_path = content_item["source"]["data"][7:]  # Remove 'file://'
-                    try:
-                        encoded_image = encode_image_to_base64(image_path)
-                        content_item["source"]["data"] = encoded_image
-                        content_item["source"]["type"] = "base64"
-                        content_item["source"]["media_type"] = f"image/{os.path.splitext(image_path)[1][1:].lower()}"
-                    except Exception as e:
-                        raise RuntimeError(f"Failed to encode image {image_path}: {e}")
+        content = message.get("content")
+        if not isinstance(content, list):
+            continue
+        for content_item in content:
+            if content_item.get("type") != "image":
+                continue
+            source = content_item["source"]
+            data = source.get("data") or ""
+            if not data.startswith("file://"):
+                continue
+            image_path = data[7:]  # Remove 'file://'
+            if image_path not in encoded_images:
+                try:
+                    encoded_images[image_path] = encode_image_to_base64(image_path)
+                except Exception as e:
+                    raise RuntimeError(f"Failed to encode image {image_path}: {e}")
+            source["data"] = encoded_images[image_path]
+            source["type"] = "base64"
+            source["media_type"] = f"image/{os.path.splitext(image_path)[1][1:].lower()}"
+    return system_prompt, messages
+
+def get_anthropic_completion(messages: List[Dict[str, Any]], args: Dict, index: int = -1) -> Dict[str, Any]:
+    """
+    Sends a completion request to Anthropic's API with proper image encoding.
+    """
+    anthropic_client = get_anthropic_client()
+    system_prompt, messages = prepare_anthropic_messages(messages)
     
-    response_content = ""
     try:
         with anthropic_client.messages.stream(
             model=args.model,
@@ -230,10 +505,36 @@ def get_anthropic_completion(messages: List[Dict[str, Any]], args: Dict, index:
             temperature=args.temperature,
             max_tokens=args.max_tokens,
         ) as stream:
-            for text in stream.text_stream:
-                print(text, end="", flush=True)
-                response_content += text
-            print("\r")
+            response_content = collect_stream(stream.text_stream, io.StringIO())
+            if stream_echo.get():
+                print("\r")
+    except Exception as e:
+        raise RuntimeError(f"Anthropic API request failed: {e}")
+    
+    return {"role": "assistant", "content": response_content}
+
+async def get_anthropic_completion_async(messages: List[Dict[str, Any]], args: Dict, index: int = -1) -> Dict[str, Any]:
+    """
+    Async counterpart of get_anthropic_completion using anthropic.AsyncClient.
+    """
+    import anthropic
+
+    system_prompt, messages = prepare_anthropic_messages(messages)
+    
+    try:
+        # Async clients are bound to the running event loop, so each call opens (and
+        # closes) its own rather than sharing one.
+        async with anthropic.AsyncClient(max_retries=RETRY_ATTEMPTS - 1) as anthropic_client:
+            async with anthropic_client.messages.stream(
+                model=args.model,
+                system=system_prompt,
+                messages=messages,
+                temperature=args.temperature,
+                max_tokens=args.max_tokens,
+            ) as stream:
+                response_content = await collect_stream_async(stream.text_stream, io.StringIO())
+                if stream_echo.get():
+                    print("\r")
     except Exception as e:
         raise RuntimeError(f"Anthropic API request failed: {e}")
     
@@ -243,27 +544,25 @@ def get_anthropic_completion(messages: List[Dict[str, Any]], args: Dict, index:
 
 def get_local_completion(messages: List[Dict[str, any]], args: Dict, index: int = -1) -> Dict[str, any]:
     llamacpp_root_dir = os.getenv('LLAMACPP_DIR')
-    llamacpp_log_dir = os.getenv('LLAMACPP_LOG_DIR')
-    if not llamacpp_root_dir or not llamacpp_log_dir:
-        raise EnvironmentError("LLAMACPP environment variables not set.")
+    if not llamacpp_root_dir:
+        raise EnvironmentError("LLAMACPP_DIR environment variable not set.")
+    api_config = get_api_config()
     model_options = api_config["llamacpp"][args.model.split("-")[0].lower()]
     model_path = api_config["local_llms_dir"] + args.model + ".gguf"
 
     def format_message(messages: List[Dict[str, any]]) -> str:
-        prompt_string = model_options["prompt-prefix"]
-        for i, msg in enumerate(messages):
-            prompt_string += model_options["format"].format(
-                role=msg["role"], content=msg["content"]
-            )
-            if i == len(messages) - 1:
-                prompt_string += model_options["in-suffix"]
-        return prompt_string
+        fmt = model_options["format"].format
+        parts = [model_options["prompt-prefix"]]
+        parts.extend(fmt(role=msg["role"], content=msg["content"]) for msg in messages)
+        if messages:
+            parts.append(model_options["in-suffix"])
+        return "".join(parts)
 
     command = [
         llamacpp_root_dir + "llama-cli",
         "-m",
         str(model_path),
-        "--color",
+        "--no-display-prompt",
         "--temp",
         str(args.temperature),
         "-n",
@@ -272,48 +571,203 @@ def get_local_completion(messages: List[Dict[str, any]], args: Dict, index: int
         format_message(messages),
         "-r",
         f"{model_options['stop']}",
-        "-ld",
-        llamacpp_log_dir,
     ]
-    print(command)
-    try:
-        try: 
-            subprocess.run(command, 
-                        check=True, 
-                        stderr=subprocess.PIPE,
-                        universal_newlines=True, 
-                        wd=os.getenv('HOME'))
-            print("\n")
-            log_files = [
-                os.path.join(llamacpp_log_dir, f)
-                for f in os.listdir(llamacpp_log_dir)
-                if os.path.isfile(os.path.join(llamacpp_log_dir, f))
-            ]
-            return {
-                "role": "assistant",
-                "content": str(
-                    load_config(max(log_files, key=os.path.getmtime))["output"]
-                ),
-            }
-        except KeyboardInterrupt:
-            print("KeyboardInterrupt")
-    except subprocess.CalledProcessError as e:
-        raise RuntimeError(f"Error running local model {args.model}: {e.stderr}")
+    output = io.StringIO()
+    # stderr goes to a temp file: llama.cpp's load logs can fill a pipe we aren't reading.
+    with tempfile.TemporaryFile() as stderr_file:
+        with subprocess.Popen(command,
+                              stdout=subprocess.PIPE,
+                              stderr=stderr_file,
+                              cwd=os.getenv('HOME')) as process:
+            try:
+                collect_stream(iter_process_text(process.stdout), output)
+            except KeyboardInterrupt:
+                process.terminate()
+                print("KeyboardInterrupt")
+        if process.returncode > 0:
+            stderr_file.seek(0)
+            stderr = stderr_file.read().decode("utf-8", errors="replace")
+            raise RuntimeError(f"Error running local model {args.model}: {stderr}")
+    if stream_echo.get():
+        print("\n")
+    return {"role": "assistant", "content": output.getvalue()}
     
-def complete(messages: List[Message], args: Dict, index: int = -1) -> Dict[str, any]: 
+async def get_completion_async(messages: List[Message], args: Dict, executor: ThreadPoolExecutor = None) -> Dict[str, any]:
+    """
+    Return the completion message for args.model without blocking the event loop.
+
+    Anthropic uses its async client; the requests-based and llama.cpp backends run
+    in a worker thread (from `executor` if given, otherwise the loop's default), so
+    callers can asyncio.gather several completions at once.
+    """
+    def run_blocking(function, *function_args):
+        if executor is None:
+            return asyncio.to_thread(function, *function_args)
+        # Like asyncio.to_thread, carry the caller's context (e.g. stream_echo) into the worker.
+        context = contextvars.copy_context()
+        return asyncio.get_running_loop().run_in_executor(executor, context.run, function, *function_args)
+
+    if getattr(args, "context_tokens", 0):
+        messages = fit_to_context(messages, args.context_tokens, args.max_tokens)
+
     provider, api_key_string, completion_url = get_provider_details(args.model)
     if provider == "anthropic":
-        completion = get_anthropic_completion(messages, args)
+        return await get_anthropic_completion_async(messages, args)
     elif provider == "local":
-        completion = get_local_completion(messages, args)
+        return await run_blocking(get_local_completion, messages, args)
+    return await run_blocking(send_request, completion_url, api_key_string, messages, args)
+
+async def get_completions_async(calls: List[Tuple[List[Message], Dict]], concurrency: int = 32) -> List[Dict[str, any]]:
+    """
+    Run get_completion_async for each (messages, args) pair, at most `concurrency` at a time.
+
+    Replies are collected silently and printed under their model name as they finish.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded_completion(messages: List[Message], args: Dict) -> Dict[str, any]:
+        # Each task runs in its own copy of the caller's context, so this doesn't leak out.
+        stream_echo.set(False)
+        async with semaphore:
+            completion = await get_completion_async(messages, args)
+        print_model_reply(args.model, completion)
+        return completion
+
+    return await asyncio.gather(*(bounded_completion(messages, args) for messages, args in calls))
+
+async def race_completion(messages: List[Message], args_list: List[Dict]) -> Dict[str, any]:
+    """
+    Send the same conversation to every model in args_list and return the first reply.
+
+    Contenders stream silently and only the winner is printed. Failed requests (empty
+    replies) are skipped; if no contender answers, the last error is raised. Losing
+    Anthropic contenders are cancelled. Threaded contenders cannot be interrupted, so
+    they run on a dedicated pool that is shut down without waiting: the winner is
+    returned as soon as it arrives, and the losers finish silently in the background.
+    The pool's threads are not daemon threads, so the interpreter still waits for
+    them before it exits.
+    """
+    if not args_list:
+        raise ValueError("race_completion needs at least one model configuration")
+    executor = ThreadPoolExecutor(max_workers=len(args_list))
+    token = stream_echo.set(False)
+    try:
+        pending = {asyncio.create_task(get_completion_async(messages, args, executor)) for args in args_list}
+    finally:
+        stream_echo.reset(token)
+    winner = None
+    last_error = None
+    try:
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.cancelled():
+                    continue
+                if task.exception() is not None:
+                    last_error = task.exception()
+                elif task.result()["content"]:
+                    winner = task.result()
+                    break
+    finally:
+        for task in pending:
+            task.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+    if winner is None:
+        if last_error is not None:
+            raise last_error
+        raise RuntimeError("Every model in the race returned an empty reply")
+    print(winner["content"])
+    return winner
+
+def run_batch(calls: List[Tuple[List[Message], Dict]], concurrency: int = 32) -> List[Dict[str, any]]:
+    """Synchronous entry point for get_completions_async; results follow the order of calls."""
+    return asyncio.run(get_completions_async(calls, concurrency))
+
+# Providers with a dedicated backend; everything else is an OpenAI-compatible endpoint.
+PROVIDER_DISPATCH = {
+    "anthropic": get_anthropic_completion,
+    "local": get_local_completion,
+}
+
+# Replies to deterministic (temperature 0) requests, most recently used last.
+RESPONSE_CACHE_SIZE = 256
+_response_cache: "OrderedDict[bytes, Dict[str, any]]" = OrderedDict()
+
+def response_cache_key(messages: List[Message], args: Dict) -> bytes:
+    key_data = [args.model, args.max_tokens, messages]
+    if orjson is not None:
+        payload = orjson.dumps(key_data, option=orjson.OPT_SORT_KEYS, default=str)
+    else:
+        payload = json.dumps(key_data, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.blake2b(payload, digest_size=16).digest()
+
+def get_completion(messages: List[Message], args: Dict) -> Dict[str, any]:
+    """Return the completion message for args.model from its provider.
+
+    Temperature 0 requests are served from an in-process LRU cache when the same
+    model has already answered the same conversation.
+    """
+    cache_key = response_cache_key(messages, args) if args.temperature == 0 else None
+    if cache_key in _response_cache:
+        _response_cache.move_to_end(cache_key)
+        completion = _response_cache[cache_key]
+        if stream_echo.get():
+            print(completion["content"])
+        return dict(completion)
+
+    if getattr(args, "context_tokens", 0):
+        messages = fit_to_context(messages, args.context_tokens, args.max_tokens)
+
+    provider, api_key_string, completion_url = get_provider_details(args.model)
+    provider_completion = PROVIDER_DISPATCH.get(provider)
+    if provider_completion:
+        completion = provider_completion(messages, args)
     else:
         completion = send_request(completion_url, api_key_string, messages, args)
-    messages.append(completion)
+
+    if cache_key is not None and completion and completion["content"]:
+        _response_cache[cache_key] = dict(completion)
+        if len(_response_cache) > RESPONSE_CACHE_SIZE:
+            _response_cache.popitem(last=False)
+    return completion
+
+def print_model_reply(model_name: str, completion: Dict[str, any]) -> None:
+    """Print a reply that was collected without echo, under the model that wrote it."""
+    Colors.print_bold(f"[{model_name}]", Colors.PURPLE)
+    print(completion["content"])
+
+def get_completions_parallel(messages: List[Message], args_list: List[Dict]) -> List[Dict[str, any]]:
+    """
+    Complete the same conversation with several model configurations at once.
+
+    Each request spends its time waiting on the network or a subprocess, so threads
+    overlap them. Replies are collected silently and printed under their model name
+    as they finish; results are returned in the order of args_list.
+    """
+    if not args_list:
+        return []
+
+    def complete_silently(args: Dict) -> Dict[str, any]:
+        # Runs in its own copy of the caller's context, so this doesn't leak out.
+        stream_echo.set(False)
+        return get_completion(messages, args)
+
+    with ThreadPoolExecutor(max_workers=len(args_list)) as executor:
+        futures = {
+            executor.submit(contextvars.copy_context().run, complete_silently, args): args
+            for args in args_list
+        }
+        for future in as_completed(futures):
+            print_model_reply(futures[future].model, future.result())
+        return [future.result() for future in futures]
+
+def complete(messages: List[Message], args: Dict, index: int = -1) -> Dict[str, any]: 
+    messages.append(get_completion(messages, args))
     return messages
 
 
 def model(messages: List[Message], args: Dict, index: int = -1) -> Dict[str, any]:
-    model = list_input(full_model_choices, "Select model to use")
+    model = list_input(get_full_model_choices(), "Select model to use")
     if model: args.model = model
     return messages
 
@@ -336,10 +790,7 @@ def max_tokens(messages: List[Message], args: Dict, index: int = -1) -> Dict[str
 def whisper(messages: List[Message], args: Dict, index: int = -1) -> List[Message]:
     import pyaudio
     import wave
-    import threading
     import openai
-    import tempfile
-    import os
 
     p = pyaudio.PyAudio()
 
@@ -350,7 +801,7 @@ def whisper(messages: List[Message], args: Dict, index: int = -1) -> List[Messag
 
     # global flag to control recording
     stop_recording = threading.Event()
-    frames = []
+    frames = bytearray()
 
     def record_audio():
         stream = p.open(
@@ -363,8 +814,8 @@ def whisper(messages: List[Message], args: Dict, index: int = -1) -> List[Messag
 
         print("Recording... Press Enter to stop.")
         while not stop_recording.is_set():
-            data = stream.read(CHUNK)
-            frames.append(data)
+            # Dropping an overflowed buffer beats aborting the whole recording.
+            frames.extend(stream.read(CHUNK, exception_on_overflow=False))
 
         stream.stop_stream()
         stream.close()
@@ -375,7 +826,7 @@ def whisper(messages: List[Message], args: Dict, index: int = -1) -> List[Messag
             wf.setnchannels(CHANNELS)
             wf.setsampwidth(p.get_sample_size(FORMAT))
             wf.setframerate(RATE)
-            wf.writeframes(b"".join(frames))
+            wf.writeframes(frames)
             wf.close()
             return temp_audio.name
 
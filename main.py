@@ -1,16 +1,18 @@
 #!/usr/bin/python3
 
 import os
+import atexit
 import argparse
 import importlib.util
 from typing import Dict, Callable
-import traceback
-import argcomplete
 
 from utils import Colors, llt_input
 from plugins import plugins
 from logger import llt_logger
 
+LLT_PATH = os.getenv("LLT_PATH", "")
+
+
 def load_plugins(plugin_dir: str) -> None:
     """Dynamically load llt plugins from scripts in the specified directory."""
     Colors.print_bold(f"Loading plugins from directory: {plugin_dir}", Colors.BLUE)
@@ -39,9 +41,10 @@ def parse_arguments() -> argparse.Namespace:
     parser.add_argument('--max_tokens', type=int, help="Maximum number of tokens to generate.", default=4096)
     parser.add_argument('--logprobs', type=int, help="Include log probabilities in the output.", default=0)
     parser.add_argument('--top_p', type=float, help="Sample from top P tokens.", default=1.0)
-    parser.add_argument('--cmd_dir', type=str, default=os.path.join(os.getenv('LLT_PATH', ''), 'cmd'))
-    parser.add_argument('--exec_dir', type=str, default=os.path.join(os.getenv('LLT_PATH', ''), 'exec'))
-    parser.add_argument('--ll_dir', type=str, default=os.path.join(os.getenv('LLT_PATH', ''), 'll/'))
+    parser.add_argument('--context_tokens', type=int, help="Drop the oldest messages so requests fit in this many tokens (0 to disable).", default=0)
+    parser.add_argument('--cmd_dir', type=str, default=os.path.join(LLT_PATH, 'cmd'))
+    parser.add_argument('--exec_dir', type=str, default=os.path.join(LLT_PATH, 'exec'))
+    parser.add_argument('--ll_dir', type=str, default=os.path.join(LLT_PATH, 'll/'))
     parser.add_argument('-n', '--non_interactive', '--quit', action='store_true', help="Run in non-interactive mode.")
     
 
@@ -53,6 +56,7 @@ def parse_arguments() -> argparse.Namespace:
     parser.add_argument('--detach', action='store_true', help="Pop last message from given ll.")
     parser.add_argument('--fold', action='store_true', help="Fold consecutive messages from the same role into a single message.")
     parser.add_argument('--execute', action='store_true', help="Execute the last message")
+    parser.add_argument('--parallel_exec', action='store_true', help="Run the confirmed code blocks of a message concurrently.")
     parser.add_argument('--view', action='store_true', help="Print the last message.")
     parser.add_argument('--email', action='store_true', help="Send an email with the last message.")
     parser.add_argument('--url', type=str, help="The url to fetch.", default=None)
@@ -62,7 +66,10 @@ def parse_arguments() -> argparse.Namespace:
     
     parser.add_argument('--embeddings', type=str, help="The path to the embeddings file.", default="plugins/embeddings.csv")    
 
-    argcomplete.autocomplete(parser)
+    # argcomplete only has work to do when the shell's completion hook invokes llt.
+    if "_ARGCOMPLETE" in os.environ:
+        import argcomplete
+        argcomplete.autocomplete(parser)
     args = parser.parse_args()
     return args
 
@@ -73,12 +80,19 @@ def init_directories(args: argparse.Namespace) -> None:
     for directory in [args.ll_dir, args.exec_dir, args.cmd_dir]:
         os.makedirs(directory, exist_ok=True)
 
+_shell_logfile = None
+
+
 def llt_shell_log(cmd: str) -> None:
     """Log shell commands to a log file."""
-    file_path = os.path.join(os.getenv("LLT_PATH", ""), "llt_shell.log")
+    global _shell_logfile
     try:
-        with open(file_path, "a") as logfile:
-            logfile.write(f"llt> {cmd}\n")
+        if _shell_logfile is None:
+            # Kept open for the session; line buffering still writes each command out at once.
+            file_path = os.path.join(LLT_PATH, "llt_shell.log")
+            _shell_logfile = open(file_path, "a", buffering=1)
+            atexit.register(_shell_logfile.close)
+        _shell_logfile.write(f"llt> {cmd}\n")
 
     except Exception as e:
         Colors.print_colored(f"Failed to log shell command '{cmd}': {e}", Colors.RED)
@@ -136,6 +150,7 @@ def llt() -> None:
     messages = []
 
     cmds = init_cmd_map()
+    cmd_names = list(cmds)
     startup_cmds = ['load', 'file', 'execute', 'xml', 'url', 'prompt', 'fold', 'complete', 'write', 'quit']
     for cmd in startup_cmds:
         if getattr(args, cmd, None):
@@ -149,11 +164,11 @@ def llt() -> None:
 
     while True:
         try:
-            (cmd, index) = llt_input(list(cmds.keys()))
-            print(cmd, index)
-            if cmd in cmds:
+            (cmd, index) = llt_input(cmd_names)
+            command = cmds.get(cmd)
+            if command is not None:
                 messages_before = messages.copy()
-                messages = cmds[cmd](messages, args, index)
+                messages = command(messages, args, index)
                 llt_logger.log_command(cmd, messages_before, messages, args)
             else:
                 messages.append({'role': args.role, 'content': cmd})
@@ -163,6 +178,7 @@ def llt() -> None:
             llt_logger.log_info("Command interrupted")
             print("\nCommand interrupted.")
         except Exception as e:
+            import traceback
             llt_logger.log_error(str(e), {"traceback": traceback.format_exc()})
             print(f"An error occurred: {e}\n{traceback.format_exc()}")
 
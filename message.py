@@ -5,11 +5,35 @@ import json
 from typing import Optional, Dict, List
 from utils import content_input, path_input, Colors, get_valid_index, list_input
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 class Message(Dict):
     role: str
     content: any
 
+
+def read_messages(path: str) -> List[Message]:
+    """Read a saved conversation, parsing with orjson when it is available."""
+    if orjson is not None:
+        with open(path, 'rb') as file:
+            return orjson.loads(file.read())
+    with open(path, 'r', encoding="utf-8") as file:
+        return json.load(file)
+
+
+def write_messages(messages: List[Message], path: str) -> None:
+    """Save a conversation as indented JSON, serializing with orjson when it is available."""
+    if orjson is not None:
+        with open(path, 'wb') as file:
+            file.write(orjson.dumps(messages, option=orjson.OPT_INDENT_2))
+    else:
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(messages, file, indent=2)
+
 def load(messages: List[Message], args: Dict, index: int = -1)  -> List[Message]:
     if not args.load:
         args.load = "default"
@@ -19,8 +43,7 @@ def load(messages: List[Message], args: Dict, index: int = -1)  -> List[Message]
     if not os.path.exists(ll_path):
         os.makedirs(os.path.dirname(ll_path), exist_ok=True)
     else:
-        with open(ll_path, 'r') as file:
-            messages = json.load(file)
+        messages = read_messages(ll_path)
     args.load = ll_path
     return messages
 
@@ -33,8 +56,7 @@ def write(messages: List[Message], args: Dict, index: int = -1)  -> List[Message
     else:
         ll_path = path_input(args.load, args.ll_dir) if not args.non_interactive else os.path.join(args.ll_dir, args.load)
     os.makedirs(os.path.dirname(ll_path), exist_ok=True)
-    with open(ll_path, "w") as file:
-        json.dump(messages, file, indent=2)
+    write_messages(messages, ll_path)
     Colors.print_colored(
         f"Saved {len(messages)} messages to '{ll_path}'.", Colors.GREEN
     )
@@ -76,9 +98,7 @@ def attach(messages: List[Message], args: Optional[Dict] = None, index: int = -1
     if ll_path is None:
         return messages
     
-    with open(ll_path, 'r') as file:
-        new_messages = json.load(file)
-        
+    new_messages = read_messages(ll_path)
     messages.extend(new_messages)
     Colors.print_colored(f"Attached {len(new_messages)} messages to the current conversation.", Colors.GREEN)
     return messages
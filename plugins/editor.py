@@ -1,10 +1,16 @@
 # editor.py
+import io
 import os
 import re
+import sys
+import codecs
 import base64
+import asyncio
+import tempfile
 import subprocess
-import pyperclip
-from typing import List, Dict, Tuple
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Dict, Optional, Set, Tuple
 
 from utils import (
     path_input,
@@ -13,12 +19,23 @@ from utils import (
     encode_image_to_base64,
     language_extension_map,
     list_input,
+    Colors,
 )
 from plugins import plugin
 
 DEFAULT_EDITOR = "vim"
-TEMP_FILE = "tmp.txt"
-IMAGE_EXTS = [".png", ".jpg", ".jpeg", ".gif", ".bmp"]
+IMAGE_EXTS = frozenset({".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp"})
+
+_pyperclip = None
+
+
+def get_pyperclip():
+    """Import pyperclip on first clipboard use, so the other editor commands work without it."""
+    global _pyperclip
+    if _pyperclip is None:
+        import pyperclip
+        _pyperclip = pyperclip
+    return _pyperclip
 
 
 def save_code_block(filename: str, code: str, mode: str = "w") -> str:
@@ -33,29 +50,72 @@ def save_code_block(filename: str, code: str, mode: str = "w") -> str:
         return "No changes made."
 
 
-def handle_code_block(code_block: Dict, dir_path: str) -> str:
+def write_code_block(code_block: Dict, dir_path: str, action: str, created_dirs: Set[str]) -> str:
+    filename = os.path.join(dir_path, path_input(code_block["filename"], dir_path))
+    file_dir = os.path.dirname(filename)
+    if file_dir not in created_dirs:
+        os.makedirs(file_dir, exist_ok=True)
+        created_dirs.add(file_dir)
+    return save_code_block(filename, code_block["code"], action)
+
+
+def copy_code_block(code_block: Dict, dir_path: str, action: str, created_dirs: Set[str]) -> str:
+    get_pyperclip().copy(code_block["code"])
+    return "Copied code block to clipboard."
+
+
+CODE_BLOCK_ACTIONS = {
+    "w": write_code_block,
+    "e": write_code_block,
+    "a": write_code_block,
+    "c": copy_code_block,
+}
+CODE_BLOCK_ACTIONS_PROMPT = "Choose an action: write (w), edit (e), append (a), copy (c)\n"
+
+
+def handle_code_block(code_block: Dict, dir_path: str, created_dirs: Optional[Set[str]] = None) -> str:
+    """Prompt for what to do with a code block; created_dirs tracks directories already made."""
     action = (
         input(
             f"Language: {code_block['language']}\nCode: \n{code_block['code']}\n"
-            f"Choose an action: write (w), edit (e), append (a), copy (c)\n"
+            + CODE_BLOCK_ACTIONS_PROMPT
         )
         .strip()
         .lower()
     )
-    if action in ("w", "e", "a"):
-        filename = os.path.join(dir_path, path_input("", dir_path))
-        os.makedirs(os.path.dirname(filename), exist_ok=True)
-        return save_code_block(filename, code_block["code"], action)
-    elif action == "c":
-        pyperclip.copy(code_block["code"])
-        return "Copied code block to clipboard."
-    return "Skipped."
+    handler = CODE_BLOCK_ACTIONS.get(action)
+    if not handler:
+        return "Skipped."
+    return handler(code_block, dir_path, action, created_dirs if created_dirs is not None else set())
+
+
+# A fenced code block, optionally preceded by a "## filename" line naming where it belongs.
+# Both fences must start a line and the closing fence must be bare, so an info string
+# like "c++" or 'python title="x"' can't leave its closing fence to be read as an opener.
+# The body is lazily optional so an empty block closes at its own fence.
+CODE_BLOCK_RE = re.compile(
+    r"(?:^##[ \t]*(?P<filename>[^\n]+)\n)?^```(?P<info>[^\n]*)\n(?:(?P<code>.*?)\n)??```[ \t]*$",
+    re.DOTALL | re.MULTILINE,
+)
+
+
+@lru_cache(maxsize=128)
+def parse_code_blocks(content: str) -> Tuple[Tuple[str, str, str], ...]:
+    """Parse (filename, language, code) for each block; cached since messages are re-scanned."""
+    return tuple(
+        (match["filename"] or "", (match["info"].split() or [""])[0], match["code"])
+        for match in CODE_BLOCK_RE.finditer(content)
+        if match["code"] and match["code"].strip()
+    )
 
 
 def extract_code_blocks(content: str) -> List[Dict]:
-    code_block_pattern = re.compile(r"```(\w+)\n(.*?)\n```", re.DOTALL)
-    matches = code_block_pattern.findall(content)
-    return [{"language": language, "code": code} for language, code in matches]
+    if "```" not in content:
+        return []
+    return [
+        {"filename": filename, "language": language, "code": code}
+        for filename, language, code in parse_code_blocks(content)
+    ]
 
 
 @plugin
@@ -75,7 +135,8 @@ def file_include(messages: List[Dict[str, any]], args: Dict, index: int = -1) ->
         return messages
     
     _, ext = os.path.splitext(file_path)
-    if ext.lower() in IMAGE_EXTS:
+    ext = ext.lower()
+    if ext in IMAGE_EXTS:
         prompt = args.prompt if args.non_interactive else content_input()
         encoded_image = ""
         try:
@@ -93,7 +154,7 @@ def file_include(messages: List[Dict[str, any]], args: Dict, index: int = -1) ->
                             "type": "image",
                             "source": {
                                 "type": "base64",
-                                "media_type": f"image/{ext[1:].lower()}",
+                                "media_type": f"image/{ext[1:]}",
                                 "data": encoded_image,
                             },
                         },
@@ -113,7 +174,7 @@ def file_include(messages: List[Dict[str, any]], args: Dict, index: int = -1) ->
                         {
                             "type": "image_url",
                             "image_url": {
-                                "url": f"data:image/{ext[1:].lower()};base64,{encoded_image}"
+                                "url": f"data:image/{ext[1:]};base64,{encoded_image}"
                             },
                         },
                     ],
@@ -123,10 +184,9 @@ def file_include(messages: List[Dict[str, any]], args: Dict, index: int = -1) ->
             print("Unsupported model for image inclusion.")
             return messages
     else:
-        with open(file_path, "r") as file:
-            data = file.read()
-        if ext.lower() in language_extension_map:
-            data = f"# {os.path.basename(file_path)}\n```{language_extension_map[ext.lower()]}\n{data}\n```"
+        data = Path(file_path).read_text(encoding="utf-8")
+        if ext in language_extension_map:
+            data = f"# {os.path.basename(file_path)}\n```{language_extension_map[ext]}\n{data}\n```"
         messages.append({"role": args.role, "content": data})
     
     # Clear the file argument after processing
@@ -140,6 +200,15 @@ def replace_function_in_messages(
     pass
 
 
+@lru_cache(maxsize=None)
+def get_default_exec_dir(exec_dir: str, ll_path: str) -> str:
+    """Return (and create, once per process) the exec dir named after the ll namespace."""
+    # default exec dir is the same as ll namespace if not specified. if ll namespace is not specified, default exec dir is the current directory
+    default_exec_dir = os.path.join(exec_dir, os.path.splitext(ll_path)[0])
+    os.makedirs(default_exec_dir, exist_ok=True)
+    return default_exec_dir
+
+
 @plugin
 def edit(
     messages: List[Dict[str, any]], args: Dict, index: int = -1
@@ -149,19 +218,18 @@ def edit(
         if args.load
         else (args.exec_dir if args.exec_dir else os.getcwd())
     )
-    default_exec_dir = os.path.join(args.exec_dir, os.path.splitext(ll_path)[0])
-    # default exec dir is the same as ll namespace if not specified. if ll namespace is not specified, default exec dir is the current directory
-    os.makedirs(default_exec_dir, exist_ok=True)
+    default_exec_dir = get_default_exec_dir(args.exec_dir, ll_path)
     exec_dir = (
         path_input(default_exec_dir) if not args.non_interactive else default_exec_dir
     )
     message_index = get_valid_index(messages, "edit code block of", index)
+    created_dirs = set()
     messages.append(
         {
             "role": "user",
             "content": "\n".join(
                 [
-                    handle_code_block(code_block, exec_dir)
+                    handle_code_block(code_block, exec_dir, created_dirs)
                     for code_block in extract_code_blocks(
                         messages[message_index]["content"]
                     )
@@ -183,8 +251,7 @@ def code_block(
         file_path = path_input(args.file, os.getcwd())
         _, ext = os.path.splitext(file_path)
         default_language = language_extension_map.get(ext)
-        with open(file_path, "r") as file:
-            content = file.read()
+        content = Path(file_path).read_text(encoding="utf-8")
     else:
         default_language = None
 
@@ -200,14 +267,14 @@ def code_block(
 
 @plugin
 def paste(messages: List[Dict[str, any]], args: Dict, index: int = -1)  -> List[Dict[str, any]]:
-    paste = pyperclip.paste()
+    paste = get_pyperclip().paste()
     messages.append({"role": "user", "content": paste})
     return messages
 
 
 @plugin
 def copy(messages: List[Dict[str, any]], args: Dict, index: int = -1)  -> List[Dict[str, any]]:
-    pyperclip.copy(messages[-1]['content'])
+    get_pyperclip().copy(messages[-1]['content'])
     return messages
 
 
@@ -216,11 +283,17 @@ def content(
     messages: List[Dict[str, any]], args: Dict, index: int = -1
 ) -> List[Dict[str, any]]:
     message_index = get_valid_index(messages, "edit content of", index)
-    with open(TEMP_FILE, "w") as f:
+    # A private temp file, so concurrent sessions in one directory don't clobber each other.
+    with tempfile.NamedTemporaryFile("w", suffix=".md", delete=False) as f:
         f.write(messages[message_index]["content"])
-    save_code_block(TEMP_FILE, None, "e")
-    messages[message_index]["content"] = open(TEMP_FILE).read()
-    os.remove(TEMP_FILE)
+    try:
+        save_code_block(f.name, None, "e")
+        with open(f.name) as edited:
+            new_content = edited.read()
+        if new_content != messages[message_index]["content"]:
+            messages[message_index]["content"] = new_content
+    finally:
+        os.remove(f.name)
     return messages
 
 
@@ -234,17 +307,14 @@ def execute_command(messages: List[Dict[str, any]], args: Dict, index: int = -1)
         message_index = get_valid_index(messages, "execute command of", index) if not args.non_interactive else -1
         skip_check = False
     code_blocks = extract_code_blocks(messages[message_index]['content'])
-    results = [run_code_block(code_block, skip_check) for code_block in code_blocks]
+    # Confirm every block first, then run the accepted ones together.
+    commands = [command for command in (confirm_code_block(code_block, skip_check) for code_block in code_blocks) if command]
+    results = asyncio.run(run_commands(commands, args.parallel_exec))
     
     args.xml_wrap = "command"
     messages = xml_wrap(messages, args, message_index)
     
-    block_output_string = ""
-    for i, result in enumerate(results):
-        if result is None:
-            continue
-        code_block = code_blocks[i]
-        block_output_string += f"{result}\n"
+    block_output_string = "".join(f"{result}\n" for result in results)
     messages.append(
         {"role": messages[message_index]["role"], "content": block_output_string}
     )
@@ -315,26 +385,68 @@ def lines(messages: List[Dict[str, any]], args: Dict) -> List[Dict[str, any]]:
     # modify buffer
 
 
-def run_code_block(code_block: Dict, skip_check: bool = False) -> str:
+def confirm_code_block(code_block: Dict, skip_check: bool = False) -> Optional[Tuple[List[str], bool]]:
+    """Return the (args, shell) to run a code block with, or None if it is skipped."""
     language, code = code_block["language"], code_block["code"]
-    result = None
-    args, shell = [], False
-    try:
-        if language in ["bash", "shell"]:
-            args, shell = [code], True
-        elif language == 'python':
-            args = ['python3', '-c', code]
-        user_confirm = input(f"Code:\n{code}\nExecute (x) or skip (any) {language} block? ").lower() if not skip_check else 'x'
-        if user_confirm == 'x':
-            result = subprocess.run(args, 
-                                    shell=shell,
-                                    check=True, 
-                                    stdout=subprocess.PIPE, 
-                                    stderr=subprocess.PIPE,
-                                    universal_newlines=True)
-    except subprocess.CalledProcessError as e:
-        result = f"Error executing command: {e}\nError details:\n{e.stderr}"
-    return result.stdout
+    if language in ["bash", "shell"]:
+        args, shell = [code], True
+    elif language == 'python':
+        args, shell = ['python3', '-c', code], False
+    else:
+        return None
+    user_confirm = input(f"Code:\n{code}\nExecute (x) or skip (any) {language} block? ").lower() if not skip_check else 'x'
+    return (args, shell) if user_confirm == 'x' else None
+
+
+async def run_command(args: List[str], shell: bool, echo: bool = True) -> str:
+    if shell:
+        process = await asyncio.create_subprocess_shell(
+            args[0], stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+    else:
+        process = await asyncio.create_subprocess_exec(
+            *args, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+
+    async def echo_stdout() -> str:
+        # Show output as it arrives instead of only once the command has finished.
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        output = io.StringIO()
+        while True:
+            chunk = await process.stdout.read(4096)
+            text = decoder.decode(chunk, final=not chunk)
+            if echo:
+                sys.stdout.write(text)
+                sys.stdout.flush()
+            output.write(text)
+            if not chunk:
+                return output.getvalue()
+
+    stdout, stderr = await asyncio.gather(echo_stdout(), process.stderr.read())
+    await process.wait()
+    if process.returncode:
+        error = subprocess.CalledProcessError(process.returncode, args)
+        return f"Error executing command: {error}\nError details:\n{stderr.decode(errors='replace')}"
+    return stdout
+
+
+async def run_commands(commands: List[Tuple[List[str], bool]], parallel: bool = False) -> List[str]:
+    """
+    Run commands in order, or all at once when parallel; results keep the commands' order.
+
+    Output streams to the terminal only when commands run one at a time. In parallel,
+    each command's output is printed under the command once it finishes, so concurrent
+    blocks don't interleave.
+    """
+    if parallel:
+        async def run_labeled(args: List[str], shell: bool) -> str:
+            result = await run_command(args, shell, echo=False)
+            Colors.print_bold(f"[{args[0] if shell else ' '.join(args)}]", Colors.PURPLE)
+            print(result)
+            return result
+
+        return await asyncio.gather(*(run_labeled(args, shell) for args, shell in commands))
+    return [await run_command(args, shell) for args, shell in commands]
 
 @plugin
 def strip_trailing_newline(messages: List[Dict[str, any]], args: Dict, index: int = -1)  -> List[Dict[str, any]]:
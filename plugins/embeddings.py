@@ -107,9 +107,9 @@ def embeddings(messages: List[Dict[str, any]], args: Dict, index: int = -1) -> L
 
         code_root = os.path.join(args.exec_dir, rel)
     
-    if os.path.exists(code_root) and not os.path.isdir(code_root):
-        print("Code root path for embeddings exists and is a file. Recursively calling embeddings for retry (portal).")
-        return embeddings(messages, args)
+    while os.path.exists(code_root) and not os.path.isdir(code_root):
+        print("Code root path for embeddings exists and is a file. Choose another directory.")
+        code_root = path_input(os.path.join(args.exec_dir, "untitled"), args.exec_dir)
     
     os.makedirs(code_root, exist_ok=True)
     
@@ -2,6 +2,7 @@ import os, sys
 import json
 import base64
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import List, Dict
 
 from google.auth.transport.requests import Request
@@ -16,9 +17,11 @@ from plugins import plugin
 
 credentials_file = os.path.expanduser('~/llt/credentials.json')
 token_file = os.path.expanduser('~/llt/token.json')
+email_config_file = os.path.expanduser('~/llt/test_email.json')
 
 SCOPES = ['https://www.googleapis.com/auth/gmail.send']
 
+@lru_cache(maxsize=4)
 def load_config(path: str):
     with open(path, 'r') as config_file:
         return json.load(config_file)
@@ -39,6 +42,15 @@ def get_credentials():
             token.write(creds.to_json())
     return creds
 
+_gmail_client = None
+
+def get_gmail_client():
+    """Build the Gmail service once per process; credentials refresh themselves as needed."""
+    global _gmail_client
+    if _gmail_client is None:
+        _gmail_client = build('gmail', 'v1', credentials=get_credentials(), cache_discovery=False)
+    return _gmail_client
+
 @dataclass
 class Email:
     to: str
@@ -55,17 +67,18 @@ def create_message(email: Email):
 
 @plugin
 def email(messages: List[Dict], args: Dict, index: int = -1)-> List[Dict]:
-    config = load_config(os.path.expanduser('~/llt/test_email.json'))
+    config = load_config(email_config_file)
     email = Email(to=config['to'], subject=config['subject'].format(subject="message from llt"), message=messages[-1]['content'])
     try:
         email_body = create_message(email)
-        client = build('gmail', 'v1', credentials=get_credentials())
-        response = client.users().messages().send(userId="me", body=email_body).execute()
+        response = get_gmail_client().users().messages().send(userId="me", body=email_body).execute()
         print(f'Message sent successfully: {response["id"]}')
         print(f'Other details:\n{response}')
     except HttpError as error:
         print(f'An error occurred: {error}')
-    return {'role': 'user', 'content': f"Email sent to {email.to} with subject {email.subject}.\nDetails:\n{response}"}
+        return messages
+    messages.append({'role': 'user', 'content': f"Email sent to {email.to} with subject {email.subject}.\nDetails:\n{response}"})
+    return messages
 
 if __name__ == "__main__":
     if len(sys.argv) > 1:
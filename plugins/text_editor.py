@@ -78,6 +78,25 @@ def apply_to_selection(content: str, start: int, end: int,
     )
     return new_content, transformed
 
+def list_tree(path: Path, max_depth: int = 2) -> List[str]:
+    """List path and its non-hidden entries down to max_depth, like find -maxdepth."""
+    entries = [str(path)]
+
+    def walk(directory: str, depth: int):
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.name.startswith('.'):
+                        continue
+                    entries.append(entry.path)
+                    if depth < max_depth and entry.is_dir(follow_symlinks=False):
+                        walk(entry.path, depth + 1)
+        except OSError:
+            pass
+
+    walk(str(path), 1)
+    return entries
+
 @plugin
 def path_view(messages: List[Dict], args: Dict, index: int = -1) -> List[Dict]:
     """View file or directory content with optional line range."""
@@ -87,12 +106,8 @@ def path_view(messages: List[Dict], args: Dict, index: int = -1) -> List[Dict]:
         validate_path(path, "view")
         
         if path.is_dir():
-            import subprocess
-            result = subprocess.run(
-                ['find', str(path), '-maxdepth', '2', '-not', '-path', '*/\\.*'],
-                capture_output=True, text=True
-            )
-            content = f"Files in {path}:\n{result.stdout}"
+            listing = "".join(f"{entry}\n" for entry in list_tree(path))
+            content = f"Files in {path}:\n{listing}"
         else:
             content = path.read_text()
             view_range = input("Enter line range (start,end) or press enter for all: ")
@@ -1,11 +1,13 @@
 # utils.py
 import os
 import sys
+import mmap
 import readline
 import base64
 import tiktoken
 from PIL import Image
 from math import ceil
+from functools import lru_cache
 import tempfile
 from io import BytesIO
 import pprint
@@ -58,31 +60,29 @@ class Colors:
         Colors.print_colored("*********************************************************", Colors.YELLOW)
         Colors.print_colored("*********************************************************\n", Colors.YELLOW)
 
+def list_dir_entries(dirname: str, prefix: str = "") -> List[str]:
+    """List paths in dirname starting with prefix, with a trailing slash on directories."""
+    try:
+        with os.scandir(dirname) as it:
+            return [
+                os.path.join(dirname, entry.name) + ("/" if entry.is_dir() else "")
+                for entry in it
+                if entry.name.startswith(prefix)
+            ]
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+
+
 def path_completer(text, state):
     """Autocomplete file and directory paths."""
     # Expand user home directory shortcut
     text = os.path.expanduser(text)
     # If text is a directory, list its contents
     if os.path.isdir(text):
-        entries = os.listdir(text)
-        entries = [
-            os.path.join(text, entry)
-            + ("/" if os.path.isdir(os.path.join(text, entry)) else "")
-            for entry in entries
-        ]
+        entries = list_dir_entries(text)
     else:
         # Get the directory and basename
-        dirname = os.path.dirname(text) or "."
-        basename = os.path.basename(text)
-        try:
-            entries = [
-                os.path.join(dirname, entry)
-                + ("/" if os.path.isdir(os.path.join(dirname, entry)) else "")
-                for entry in os.listdir(dirname)
-                if entry.startswith(basename)
-            ]
-        except FileNotFoundError:
-            entries = []
+        entries = list_dir_entries(os.path.dirname(text) or ".", os.path.basename(text))
     # Remove duplicates and sort
     matches = sorted(set(entries))
     try:
@@ -90,13 +90,18 @@ def path_completer(text, state):
     except IndexError:
         return None
 
-def path_input(default_file: str = None, root_dir: str = None) -> str:
-    """Prompt the user to input a file or directory path with autocomplete."""
+def set_tab_completer(completer) -> None:
+    """Bind tab to completer, for both GNU readline and macOS libedit."""
     readline.set_completer_delims(" \t\n;")
     if "libedit" in readline.__doc__:
         readline.parse_and_bind("bind ^I rl_complete")
     else:
         readline.parse_and_bind("tab: complete")
+    readline.set_completer(completer)
+
+
+def path_input(default_file: str = None, root_dir: str = None) -> str:
+    """Prompt the user to input a file or directory path with autocomplete."""
 
     def completer(text, state):
         if root_dir and not os.path.isabs(os.path.expanduser(text)):
@@ -113,7 +118,7 @@ def path_input(default_file: str = None, root_dir: str = None) -> str:
         else:
             return None
 
-    readline.set_completer(completer)
+    set_tab_completer(completer)
     try:
         prompt_text = f"Enter {'file' if root_dir else 'directory'} path"
         if default_file:
@@ -146,12 +151,7 @@ def list_completer(values):
 
 def list_input(values: List[str], input_string: str = "Enter a value from list") -> str:
     """Prompt the user to select a value from a list with autocomplete."""
-    readline.set_completer_delims(" \t\n;")
-    if "libedit" in readline.__doc__:
-        readline.parse_and_bind("bind ^I rl_complete")
-    else:
-        readline.parse_and_bind("tab: complete")
-    readline.set_completer(list_completer(values))
+    set_tab_completer(list_completer(values))
     try:
         return input(
             f"{input_string} (tab to autocomplete): {Colors.RESET}"
@@ -167,9 +167,7 @@ def content_input(display_string: str = "Enter content below.") -> str:
     return content
 
 def llt_input(plugin_keys: List[str]) -> Tuple[str, int]:
-    readline.set_completer_delims(' \t\n;')
-    readline.parse_and_bind("tab: complete")
-    readline.set_completer(list_completer(plugin_keys))
+    set_tab_completer(list_completer(plugin_keys))
 
     raw_cmd = input("llt> ")
     if raw_cmd and raw_cmd[:-1].isdigit() and raw_cmd[-1].isalpha():
@@ -217,6 +215,10 @@ def count_image_tokens(file_path: str) -> int:
         return count_image_tokens_resized(width, height)
 
 
+# A multiple of 3 bytes, so chunks encode without padding and concatenate cleanly.
+BASE64_CHUNK_SIZE = 57 * 1024
+
+
 def encode_image_to_base64(image_path: str, max_dimension: int = 1568) -> str:
     """
     Encodes an image to a base64 string after resizing if necessary.
@@ -243,8 +245,17 @@ def encode_image_to_base64(image_path: str, max_dimension: int = 1568) -> str:
     
     resized_image_path = image_path
     
+    # Encode straight from a read-only mapping rather than a read() copy of the file;
+    # files that can't be mapped (empty, pipes, some network mounts) are encoded in chunks.
     with open(resized_image_path, "rb") as image_file:
-        encoded_string = base64.b64encode(image_file.read()).decode("utf-8")
+        try:
+            with mmap.mmap(image_file.fileno(), 0, access=mmap.ACCESS_READ) as image_data:
+                encoded_string = base64.b64encode(image_data).decode("ascii")
+        except (ValueError, OSError):
+            encoded = bytearray()
+            while chunk := image_file.read(BASE64_CHUNK_SIZE):
+                encoded += base64.b64encode(chunk)
+            encoded_string = encoded.decode("ascii")
     
     # Optionally, remove the resized image if it's a temporary file
     if resized_image_path != image_path:
@@ -270,20 +281,74 @@ def save_to_tmp_img_file(data_str: str) -> str:
 
 
 # Message utilities
+@lru_cache(maxsize=8)
+def get_encoding(model: str):
+    """Return the tiktoken encoding for a model, building it only once per model."""
+    return tiktoken.encoding_for_model(model)
+
+
+# tiktoken's encode is superlinear on very long inputs; beyond this many characters
+# the remainder is estimated from the encoded prefix's characters-per-token ratio.
+MAX_TOKENIZE_CHARS = 400_000
+
+
+@lru_cache(maxsize=4096)
+def count_text_tokens(text: str, model: str = "gpt-4") -> int:
+    """Count tokens in text, estimating the part beyond MAX_TOKENIZE_CHARS.
+
+    Cached per message text, since fit_to_context and tokenize recount the same
+    history before every completion.
+    """
+    num_tokens = len(get_encoding(model).encode(text[:MAX_TOKENIZE_CHARS]))
+    overflow = len(text) - MAX_TOKENIZE_CHARS
+    if overflow > 0:
+        num_tokens += ceil(overflow * num_tokens / MAX_TOKENIZE_CHARS)
+    return num_tokens
+
+
+def count_message_tokens(message: Dict[str, any], model: str = "gpt-4") -> int:
+    """Count tokens in one message's text content, plus its per-message overhead."""
+    content = message["content"]
+    if isinstance(content, list):
+        content = "".join(item["text"] for item in content if item["type"] == "text")
+    return 4 + count_text_tokens(content, model)
+
+
+def fit_to_context(
+    messages: List[Dict[str, any]], context_tokens: int, reserve: int = 0
+) -> List[Dict[str, any]]:
+    """
+    Drop the oldest messages until the conversation fits in context_tokens - reserve.
+
+    Leading system messages are always kept; the remaining history is kept from the
+    most recent message backwards for as long as it fits, starting at a user message.
+    """
+    budget = context_tokens - reserve
+    head = 0
+    while head < len(messages) and messages[head]["role"] == "system":
+        budget -= count_message_tokens(messages[head])
+        head += 1
+    start = len(messages)
+    while start > head:
+        cost = count_message_tokens(messages[start - 1])
+        if cost > budget:
+            break
+        budget -= cost
+        start -= 1
+    if start == len(messages) > head:
+        start -= 1  # always send the latest message, even if it alone is too long
+    if start == head:
+        return messages
+    # Resume the trimmed history at a user turn rather than mid-exchange.
+    while start < len(messages) - 1 and messages[start]["role"] != "user":
+        start += 1
+    Colors.print_colored(f"Dropped {start - head} message(s) to fit the context window.", Colors.YELLOW)
+    return messages[:head] + messages[start:]
+
+
 def tokenize(messages: List[Dict[str, any]], args: Dict, index: int = -1) -> int:
-    num_tokens, content = 0, ""
-    for msg in messages:
-        msg_content = msg["content"]
-        if isinstance(msg_content, list):
-            for item in msg_content:
-                if item["type"] == "text":
-                    content += item["text"]
-                # elif item['type'] == 'image_url':
-                #     num_tokens += count_image_tokens(item['image_url']['url'])
-        else:
-            content += msg_content
-    encoding = tiktoken.encoding_for_model("gpt-4")
-    num_tokens += 4 + len(encoding.encode(content))
+    # Summed per message so each count is cached by its own text, not the joined history.
+    num_tokens = sum(count_message_tokens(msg) for msg in messages)
     print(f"{Colors.BOLD}{Colors.BLUE}Tokens:{Colors.RESET} {num_tokens}")
     return num_tokens
 